@@ -1,5 +1,5 @@
 import os
-from groq import Groq
+from groq import Groq, AsyncGroq
 from dotenv import load_dotenv
 
 load_dotenv()  # loads from .env file
@@ -7,3 +7,7 @@ load_dotenv()  # loads from .env file
 client = Groq(
     api_key=os.environ.get("GROQ_API_KEY"),
 )
+
+async_client = AsyncGroq(
+    api_key=os.environ.get("GROQ_API_KEY"),
+)
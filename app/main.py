@@ -1,12 +1,29 @@
+import os
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
 from .models import Base, engine
 from .models import Csv_input, Offer, Result
 from .router import router
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create the schema once at startup rather than at import, so merely
+    # importing the module (tests, tooling) doesn't hit the database.
+    Base.metadata.create_all(bind=engine)
+    # create_all only builds indexes together with new tables; create any
+    # indexes added after a table already exists in the database.
+    for table in Base.metadata.tables.values():
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    yield
+
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 @app.get("/")
 def root():
@@ -15,4 +32,13 @@ def root():
 app.include_router(router, prefix="/api")
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=False)
+    # uvloop + httptools for faster IO primitives, plus worker processes so
+    # CPU-bound handlers (CSV parse, rule scoring) don't starve other requests.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "4")),
+    )
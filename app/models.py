@@ -1,12 +1,50 @@
 from sqlalchemy import (
-    Column, ForeignKey, Integer, String, JSON
+    Column, ForeignKey, Index, Integer, String, JSON
 )
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+import orjson
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
-engine = create_engine(DATABASE_URL)
+
+_engine_kwargs = dict(
+    insertmanyvalues_page_size=1000,
+    pool_pre_ping=True,
+    # C-level (de)serialization for the JSON offer columns
+    json_serializer=lambda value: orjson.dumps(value).decode(),
+    json_deserializer=orjson.loads,
+)
+
+# Dialect-specific tuning so the bulk inserts land efficiently
+if DATABASE_URL.startswith("postgresql"):
+    _engine_kwargs.update(
+        pool_size=10,
+        max_overflow=20,
+        executemany_mode="values_plus_batch",
+        executemany_batch_page_size=500,
+    )
+elif DATABASE_URL.startswith("mssql"):
+    _engine_kwargs.update(fast_executemany=True)
+elif DATABASE_URL.startswith("sqlite"):
+    # Sessions cross threadpool threads (e.g. the /upload parse)
+    _engine_kwargs.update(connect_args={"check_same_thread": False})
+
+engine = create_engine(DATABASE_URL, **_engine_kwargs)
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_conn, _connection_record):
+        """WAL lets /results and /download read while a long /score
+        transaction writes; the remaining PRAGMAs cut disk syncs and
+        page churn during bulk inserts."""
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-65536")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -50,7 +88,7 @@ class Offer(Base):
     __tablename__ = "offers"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(50), nullable=False, unique=True)
+    name = Column(String(50), nullable=False, unique=True, index=True)
     value_props = Column(JSON, nullable=True)
     ideal_use_cases = Column(JSON, nullable=True)
 
@@ -70,8 +108,11 @@ class Result(Base):
     __tablename__ = "results"
 
     id = Column(Integer, primary_key=True, index=True)
-    lead_id = Column(Integer, ForeignKey("csv_inputs.id"), nullable=False)
-    offer_id = Column(Integer, ForeignKey("offers.id"), nullable=False)
+    lead_id = Column(Integer, ForeignKey("csv_inputs.id"), nullable=False, index=True)
+    offer_id = Column(Integer, ForeignKey("offers.id"), nullable=False, index=True)
+
+    # Covers the per-offer join used by /results and /download
+    __table_args__ = (Index("ix_results_offer_lead", "offer_id", "lead_id"),)
 
     intent = Column(String(50), nullable=True)
     score = Column(Integer, nullable=True)
@@ -81,3 +122,36 @@ class Result(Base):
     lead = relationship("Csv_input", backref="results")
     offer = relationship("Offer", backref="results")
 
+
+class AIResponseCache(Base):
+    """
+    Caches AI intent results across /score runs.
+    Keyed by a sha256 hash of the offer details plus the prospect fields
+    that feed the prompt, so rescoring unchanged leads skips Groq entirely.
+    """
+    __tablename__ = "ai_response_cache"
+
+    prompt_hash = Column(String(64), primary_key=True)
+    intent = Column(String(50), nullable=False)
+    score = Column(Integer, nullable=False)
+    reasoning = Column(String(250), nullable=True)
+
+
+class ScoreJob(Base):
+    """
+    Tracks background /score jobs.
+    Persisted in the database so status polls reach the job no matter
+    which worker process accepted it.
+    Columns:
+        - status: running / completed / failed
+        - done, total: progress counters
+        - message: final outcome or error description
+    """
+    __tablename__ = "score_jobs"
+
+    id = Column(String(32), primary_key=True)
+    status = Column(String(20), nullable=False, default="running")
+    done = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+    message = Column(String(250), nullable=True)
+
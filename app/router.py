@@ -1,16 +1,35 @@
+import asyncio
 import csv
 import io
+import uuid
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List
 
 from app.services.scoring import Scoring
-from .models import Csv_input, Offer, Result, get_db
-from .schemas import CsvResponse, OfferCreate, OfferResponse, ResultResponse
+from .models import Csv_input, Offer, Result, ScoreJob, SessionLocal, get_db
+from .schemas import (
+    CsvResponse,
+    OfferCreate,
+    OfferResponse,
+    ResultResponse,
+    ScoreJobResponse,
+    ScoreStatusResponse,
+)
 
 router = APIRouter()
 
+LEAD_COLUMNS = ["name", "role", "company", "industry", "location", "linkedin_bio"]
+
+# The event loop only keeps weak references to tasks; hold strong ones so
+# a fire-and-forget scoring run can't be garbage-collected mid-job.
+_score_tasks: set = set()
+
 
 @router.post("/offer", response_model=OfferResponse)
 async def create_offer(offer: OfferCreate, db: Session = Depends(get_db)):
@@ -44,54 +63,126 @@ async def upload_leads(file: UploadFile = File(...), db: Session = Depends(get_d
     if not file.filename or not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="File must be a CSV")
 
-    # Clear old data before inserting new leads
-    db.query(Result).delete()
-    db.query(Csv_input).delete()
-    db.commit()
+    # Parse the CSV with pyarrow's C-level reader, validate the schema
+    # once up front, and hand the rows to the bulk insert (the engine
+    # pages the executemany into 1000-row chunks). The blocking parse +
+    # insert runs in the threadpool so the event loop stays free.
+    def parse_and_insert() -> int:
+        try:
+            table = pacsv.read_csv(
+                file.file,
+                convert_options=pacsv.ConvertOptions(
+                    column_types={c: pa.string() for c in LEAD_COLUMNS}
+                ),
+            )
+        except pa.ArrowInvalid as e:
+            raise HTTPException(status_code=400, detail=f"Invalid CSV file: {str(e)}")
+
+        missing = [c for c in LEAD_COLUMNS if c not in table.column_names]
+        if missing:
+            raise HTTPException(
+                status_code=400,
+                detail=f"CSV is missing required columns: {', '.join(missing)}",
+            )
+
+        rows = table.select(LEAD_COLUMNS).to_pylist()
+
+        # Clear old data only once the new file has parsed and validated,
+        # in the same transaction as the insert
+        db.query(Result).delete()
+        db.query(Csv_input).delete()
+        if rows:
+            db.execute(Csv_input.__table__.insert(), rows)
+        db.commit()
+        return len(rows)
+
+    count = await run_in_threadpool(parse_and_insert)
+
+    return {"message": f"{count} leads uploaded successfully. Previous data cleared."}
+
 
-    content = await file.read()
-    reader = csv.DictReader(io.StringIO(content.decode("utf-8")))
-
-    count = 0
-    for row in reader:
-        lead = Csv_input(
-            name=row.get("name", ""),
-            role=row.get("role", ""),
-            company=row.get("company", ""),
-            industry=row.get("industry", ""),
-            location=row.get("location", ""),
-            linkedin_bio=row.get("linkedin_bio", ""),
+async def _run_score_job(job_id: str, offer_id: int, offer_name: str,
+                         leads_dict: List[Dict], offer_dict: Dict):
+    """
+    Background scoring run. Uses its own session since the request's
+    session closes as soon as the job is accepted; progress lands in the
+    score_jobs table so any worker process can answer status polls.
+    """
+    db = SessionLocal()
+    try:
+        scoring = Scoring()
+
+        def on_progress(count: int):
+            db.execute(
+                update(ScoreJob)
+                .where(ScoreJob.id == job_id)
+                .values(done=ScoreJob.done + count)
+            )
+            db.commit()
+
+        scoring_results = await scoring.final_score_bulk(
+            leads_dict, offer_dict, db=db, progress_cb=on_progress
         )
-        db.add(lead)
-        count += 1
 
-    db.commit()
-    return {"message": f"{count} leads uploaded successfully. Previous data cleared."}
+        # Swap old results for new ones in one transaction, committed only
+        # after scoring succeeds — a crash mid-scoring leaves the previous
+        # results untouched.
+        result_rows = [
+            {
+                "lead_id": leads_dict[i]["id"],
+                "offer_id": offer_id,
+                "intent": intent,
+                "score": total_score,
+                "reasoning": reasoning,
+            }
+            for i, (intent, total_score, reasoning) in enumerate(scoring_results)
+        ]
+        db.query(Result).filter(Result.offer_id == offer_id).delete()
+        if result_rows:
+            db.execute(Result.__table__.insert(), result_rows)
+        db.execute(
+            update(ScoreJob)
+            .where(ScoreJob.id == job_id)
+            .values(
+                status="completed",
+                message=(
+                    f"Scored {len(result_rows)} leads for offer '{offer_name}'. "
+                    "Previous results cleared."
+                ),
+            )
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        db.execute(
+            update(ScoreJob)
+            .where(ScoreJob.id == job_id)
+            .values(status="failed", message=f"Scoring failed: {str(e)}")
+        )
+        db.commit()
+    finally:
+        db.close()
 
 
-@router.post("/score", response_model=OfferResponse)
+@router.post("/score", response_model=ScoreJobResponse)
 async def score_leads(offer_name: str, db: Session = Depends(get_db)):
     """
-    Score all uploaded leads for a given offer.
-    - Clears existing results for the offer before scoring.
-    - Uses bulk scoring for better performance.
+    Kick off scoring of all uploaded leads for a given offer.
+    - Returns a job id immediately; poll /score/status/{job_id} for progress.
+    - Replaces existing results for the offer atomically once scoring finishes.
     """
     offer = db.query(Offer).filter(Offer.name == offer_name).first()
     if not offer:
         raise HTTPException(status_code=404, detail="Offer not found")
 
-    # Remove previous results for this offer
-    db.query(Result).filter(Result.offer_id == offer.id).delete()
-    db.commit()
-
     all_leads = db.query(Csv_input).all()
+
+    job_id = uuid.uuid4().hex
     if not all_leads:
-        return {
-            "name": offer.name,
-            "value_props": offer.value_props,
-            "ideal_use_cases": offer.ideal_use_cases,
-            "message": f"No leads found to score for offer '{offer_name}'.",
-        }
+        message = f"No leads found to score for offer '{offer_name}'."
+        db.add(ScoreJob(id=job_id, status="completed", done=0, total=0, message=message))
+        db.commit()
+        return {"job_id": job_id, "name": offer.name, "message": message}
 
     # Convert leads to dictionaries
     leads_dict = [
@@ -114,30 +205,36 @@ async def score_leads(offer_name: str, db: Session = Depends(get_db)):
         "ideal_use_cases": offer.ideal_use_cases or [],
     }
 
-    # Run bulk scoring
-    scoring = Scoring()
-    scoring_results = scoring.final_score_bulk(leads_dict, offer_dict)
-
-    # Save results
-    scored_count = 0
-    for i, (intent, total_score, reasoning) in enumerate(scoring_results):
-        scored_lead = Result(
-            lead_id=leads_dict[i]["id"],
-            offer_id=offer.id,
-            intent=intent,
-            score=total_score,
-            reasoning=reasoning,
-        )
-        db.add(scored_lead)
-        scored_count += 1
-
+    db.add(ScoreJob(id=job_id, status="running", done=0, total=len(leads_dict)))
     db.commit()
+    task = asyncio.create_task(
+        _run_score_job(job_id, offer.id, offer_name, leads_dict, offer_dict)
+    )
+    _score_tasks.add(task)
+    task.add_done_callback(_score_tasks.discard)
 
     return {
+        "job_id": job_id,
         "name": offer.name,
-        "value_props": offer.value_props,
-        "ideal_use_cases": offer.ideal_use_cases,
-        "message": f"Scored {scored_count} leads for offer '{offer_name}'. Previous results cleared.",
+        "message": f"Scoring {len(leads_dict)} leads for offer '{offer_name}' in the background.",
+    }
+
+
+@router.get("/score/status/{job_id}", response_model=ScoreStatusResponse)
+async def score_status(job_id: str, db: Session = Depends(get_db)):
+    """
+    Report progress of a background scoring job.
+    """
+    job = db.query(ScoreJob).filter(ScoreJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "done": job.done,
+        "total": job.total,
+        "message": job.message,
     }
 
 
@@ -150,19 +247,24 @@ async def get_results(offer_name: str, db: Session = Depends(get_db)):
     if not offer:
         raise HTTPException(status_code=404, detail="Offer not found")
 
-    results = db.query(Result).filter(Result.offer_id == offer.id).all()
-
-    return [
-        ResultResponse(
-            name=r.lead.name,
-            role=r.lead.role,
-            company=r.lead.company,
-            intent=r.intent,
-            score=r.score,
-            reasoning=r.reasoning,
+    # Project exactly the response columns in one JOIN; no ORM objects
+    # get hydrated on this path.
+    rows = (
+        db.query(
+            Csv_input.name,
+            Csv_input.role,
+            Csv_input.company,
+            Result.intent,
+            Result.score,
+            Result.reasoning,
         )
-        for r in results
-    ]
+        .select_from(Result)
+        .join(Csv_input, Result.lead_id == Csv_input.id)
+        .filter(Result.offer_id == offer.id)
+        .all()
+    )
+
+    return [ResultResponse.model_validate(row) for row in rows]
 
 
 @router.get("/download")
@@ -175,36 +277,50 @@ async def download_csv(offer_name: str, db: Session = Depends(get_db)):
     if not offer:
         raise HTTPException(status_code=404, detail="Offer not found")
 
-    results = db.query(Result).filter(Result.offer_id == offer.id).all()
-    if not results:
+    if not db.query(Result.id).filter(Result.offer_id == offer.id).first():
         raise HTTPException(status_code=404, detail="No results found for this offer")
 
-    # Write results to in-memory CSV
-    stream = io.StringIO()
-    writer = csv.writer(stream)
-    writer.writerow(
-        ["name", "role", "company", "industry", "location", "intent", "score", "reasoning"]
+    # Project exactly the CSV columns with one JOIN and stream them out
+    # in yield_per chunks instead of buffering the whole file in memory.
+    rows = (
+        db.query(
+            Csv_input.name,
+            Csv_input.role,
+            Csv_input.company,
+            Csv_input.industry,
+            Csv_input.location,
+            Result.intent,
+            Result.score,
+            Result.reasoning,
+        )
+        .select_from(Result)
+        .join(Csv_input, Result.lead_id == Csv_input.id)
+        .filter(Result.offer_id == offer.id)
+        .yield_per(1000)
     )
 
-    for r in results:
+    # Sync generator on purpose: Starlette iterates it in the threadpool,
+    # so the blocking DB cursor never touches the event loop. The small
+    # StringIO keeps csv.writer's RFC 4180 quoting and is truncated
+    # between rows.
+    def iter_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
         writer.writerow(
-            [
-                r.lead.name,
-                r.lead.role,
-                r.lead.company,
-                r.lead.industry,
-                r.lead.location,
-                r.intent,
-                r.score,
-                r.reasoning,
-            ]
+            ["name", "role", "company", "industry", "location", "intent", "score", "reasoning"]
         )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
 
-    output = stream.getvalue()
-    stream.close()
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
 
     return StreamingResponse(
-        io.StringIO(output),
+        iter_csv(),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={offer_name}_results.csv"},
     )
@@ -1,5 +1,5 @@
 from typing import List, Optional
-from pydantic import BaseModel, Field, HttpUrl
+from pydantic import BaseModel, ConfigDict, Field, HttpUrl
 
 
 class CsvBase(BaseModel):
@@ -14,10 +14,9 @@ class CsvCreate(CsvBase):
     pass
 
 class CsvResponse(BaseModel):
-    message:str
+    model_config = ConfigDict(from_attributes=True)
 
-    class Config:
-        orm_mode = True
+    message:str
 
 class OfferBase(BaseModel):
     name: Optional[str]
@@ -28,11 +27,22 @@ class OfferCreate(OfferBase):
     pass
 
 class OfferResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    name: str
+    message: str
+
+class ScoreJobResponse(BaseModel):
+    job_id: str
     name: str
     message: str
 
-    class Config:
-        orm_mode = True
+class ScoreStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    done: int
+    total: int
+    message: Optional[str] = None
 
 class ResultCreate(BaseModel):
     name: Optional[str] = Field(None, max_length=50)
@@ -40,9 +50,8 @@ class ResultCreate(BaseModel):
     company: Optional[str] = Field(None, max_length=50)
 
 class ResultResponse(ResultCreate):
+    model_config = ConfigDict(from_attributes=True)
+
     intent: str = Field(..., max_length=50)
     score: int = Field(..., ge=0)
-    reasoning: str 
-
-    class Config:
-        orm_mode = True
+    reasoning: str
@@ -1,13 +1,49 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import hashlib
 import logging
+import os
 from dataclasses import dataclass
-from ..config import client
-from typing import Any, List, Dict, Tuple, Optional
+from sqlalchemy.orm import Session
+from ..models import AIResponseCache
+from aiolimiter import AsyncLimiter
+from groq import APIConnectionError, RateLimitError
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+from ..config import client, async_client
+from typing import Any, Callable, List, Dict, Tuple, Optional
 import json
+import re
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+# Matches one "PROSPECT n: [HIGH/MEDIUM/LOW] - reasoning" response line.
+_PROSPECT_LINE = re.compile(
+    r"PROSPECT\s+(\d+)\s*:\s*\[?\s*(HIGH|MEDIUM|LOW)\s*\]?\s*[-:]?\s*(.*)",
+    re.IGNORECASE,
+)
+
+# Proactive rate limiting: keep throughput near the RPM/TPM ceiling instead
+# of reacting to 429 storms. Module-level so every Scoring instance in the
+# process draws from the same budget — concurrent /score jobs would
+# otherwise each get their own.
+_REQUEST_LIMITER = AsyncLimiter(int(os.getenv("GROQ_RPM", "30")), 60)
+_TOKEN_LIMITER = AsyncLimiter(int(os.getenv("GROQ_TPM", "6000")), 60)
+
+
+def _compile_keyword_pattern(keywords) -> "re.Pattern":
+    """Compile a set of keywords into one regex alternation so matching
+    is a single C-level pass instead of a Python loop of substring scans."""
+    alternation = "|".join(
+        sorted((re.escape(k) for k in keywords), key=len, reverse=True)
+    )
+    return re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE)
+
 @dataclass
 class ScoringWeights:
     DECISION_MAKER_SCORE: int = 20
@@ -20,9 +56,15 @@ class ScoringWeights:
     AI_LOW_SCORE: int = 10
 
 class Scoring:
-    def __init__(self):
-        self.batch_size = 10
-        self.max_workers = 3
+    def __init__(self, batch_size: Optional[int] = None,
+                 max_concurrency: Optional[int] = None):
+        # Larger batches amortize the repeated offer preamble and network
+        # round-trip across more prospects per request against the RPM cap.
+        self.batch_size = batch_size or int(os.getenv("SCORING_BATCH_SIZE", "25"))
+        self.max_concurrency = max_concurrency or int(os.getenv("SCORING_MAX_CONCURRENCY", "20"))
+        # One intent line per prospect comes back; scale the completion
+        # budget with the batch size instead of a fixed 800.
+        self.max_completion_tokens = min(60 * self.batch_size, 2000)
         self.weights = ScoringWeights()
         self.decision_makers = {
             'ceo', 'cto', 'cfo', 'president', 'founder', 'co-founder',
@@ -31,48 +73,54 @@ class Scoring:
         self.influencers = {
             'manager', 'senior', 'lead', 'architect', 'principal'
         }
+        self._dm_pattern = _compile_keyword_pattern(self.decision_makers)
+        self._inf_pattern = _compile_keyword_pattern(self.influencers)
         self.required_fields = {'name', 'role', 'company', 'industry'}
 
     def _role_score(self, role: str) -> int:
         if not role:
             return 0
-            
+
         role_clean = role.lower().strip()
-        
-        if any(dm in role_clean for dm in self.decision_makers):
+
+        if self._dm_pattern.search(role_clean):
             return self.weights.DECISION_MAKER_SCORE
-            
-        if any(inf in role_clean for inf in self.influencers):
+
+        if self._inf_pattern.search(role_clean):
             return self.weights.INFLUENCER_SCORE
-            
+
         return 0
 
-    def _industry_score(self, industry: str, offer_data: Dict) -> int:
-        if not industry or not offer_data:
-            return 0
-        
-        ideal_use_cases = offer_data.get('ideal_use_cases', [])
-        if not ideal_use_cases:
+    def _prepare_use_cases(self, offer_data: Dict) -> List[Tuple[str, set]]:
+        """Lower and tokenize the offer's ideal use cases once so per-lead
+        industry matching is just string compares and set intersections."""
+        if not offer_data:
+            return []
+        return [
+            (uc_lower, set(uc_lower.split()))
+            for uc_lower in (
+                str(uc).lower().strip()
+                for uc in offer_data.get('ideal_use_cases', []) or []
+            )
+        ]
+
+    def _industry_score(self, industry: str, use_cases: List[Tuple[str, set]]) -> int:
+        if not industry or not use_cases:
             return 0
-        
+
         industry_lower = industry.lower().strip()
-        
-        for use_case in ideal_use_cases:
-            use_case_lower = str(use_case).lower().strip()
-            
+        industry_tokens = set(industry_lower.split())
+
+        for use_case_lower, use_case_tokens in use_cases:
             if industry_lower == use_case_lower:
                 return self.weights.EXACT_ICP_SCORE
-            
-            industry_keywords = industry_lower.split()
-            use_case_keywords = use_case_lower.split()
-            common_keywords = set(industry_keywords) & set(use_case_keywords)
-            
-            if common_keywords:
+
+            if industry_tokens & use_case_tokens:
                 return self.weights.ADJACENT_ICP_SCORE
-            
-            if any(k in use_case_lower for k in industry_keywords) or any(k in industry_lower for k in use_case_keywords):
+
+            if any(k in use_case_lower for k in industry_tokens) or any(k in industry_lower for k in use_case_tokens):
                 return self.weights.ADJACENT_ICP_SCORE
-        
+
         return 0
 
     def _completeness_score(self, prospect: Dict) -> int:
@@ -83,27 +131,52 @@ class Scoring:
             return self.weights.COMPLETENESS_SCORE
         return 0
 
-    def calculate_rule_score(self, prospect: Dict, offer_data: Dict) -> int:
+    def calculate_rule_score(self, prospect: Dict, offer_data: Dict,
+                             use_cases: Optional[List[Tuple[str, set]]] = None) -> int:
+        if use_cases is None:
+            use_cases = self._prepare_use_cases(offer_data)
+
         role_score = self._role_score(prospect.get('role', ''))
-        industry_score = self._industry_score(prospect.get('industry', ''), offer_data)
+        industry_score = self._industry_score(prospect.get('industry', ''), use_cases)
         completeness_score = self._completeness_score(prospect)
         
         total = role_score + industry_score + completeness_score
         return total
 
-    def ai_intent_score(self, prospect: Dict, offer_data: Dict) -> Tuple[str, int, str]:
-        try:
-            offer_data = self._normalize_offer_data(offer_data)
-            
-            value_props = offer_data.get('value_props', [])
-            ideal_use_cases = offer_data.get('ideal_use_cases', [])
-            
-            offer_info = f"""
+    def calculate_rule_scores(self, leads: List[Dict], offer_data: Dict) -> List[int]:
+        """Rule-score all leads in one tight loop. Offer-level work is done
+        once up front and the hot callables are bound to locals, which adds
+        up when scoring thousands of leads."""
+        use_cases = self._prepare_use_cases(offer_data)
+        role_score = self._role_score
+        industry_score = self._industry_score
+        completeness_score = self._completeness_score
+
+        scores = []
+        append = scores.append
+        for lead in leads:
+            append(
+                role_score(lead.get('role', ''))
+                + industry_score(lead.get('industry', ''), use_cases)
+                + completeness_score(lead)
+            )
+        return scores
+
+    def _build_offer_info(self, offer_data: Dict) -> str:
+        value_props = offer_data.get('value_props', [])
+        ideal_use_cases = offer_data.get('ideal_use_cases', [])
+
+        return f"""
 Product: {offer_data.get('name', 'N/A')}
 Value Props: {', '.join(value_props) if value_props else 'N/A'}
 Ideal Use Cases: {', '.join(ideal_use_cases) if ideal_use_cases else 'N/A'}
-            """.strip()
-            
+        """.strip()
+
+    def ai_intent_score(self, prospect: Dict, offer_data: Dict) -> Tuple[str, int, str]:
+        try:
+            offer_data = self._normalize_offer_data(offer_data)
+            offer_info = self._build_offer_info(offer_data)
+
             linkedin_bio = str(prospect.get('linkedin_bio', 'N/A'))[:200]
             
             prompt = f"""Analyze this prospect's fit for our offer:
@@ -144,70 +217,155 @@ Respond with: [HIGH/MEDIUM/LOW] - [brief explanation]"""
             logger.warning(f"AI scoring failed: {str(e)}")
             return ("Low", self.weights.AI_LOW_SCORE, f"AI unavailable: {str(e)}")
 
-    def ai_intent_score_bulk(self, prospects: List[Dict], offer_data: Dict) -> List[Tuple[str, int, str]]:
+    def _prospect_cache_key(self, prospect: Dict, offer_data: Dict) -> str:
+        payload = "|".join([
+            str(offer_data.get('name', '')),
+            ",".join(offer_data.get('value_props', [])),
+            ",".join(offer_data.get('ideal_use_cases', [])),
+            str(prospect.get('role', '')),
+            str(prospect.get('industry', '')),
+            str(prospect.get('linkedin_bio', ''))[:200],
+        ])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load_cached_results(self, db: Session, keys: List[str]) -> Dict[str, Tuple[str, int, str]]:
+        rows = (
+            db.query(AIResponseCache)
+            .filter(AIResponseCache.prompt_hash.in_(set(keys)))
+            .all()
+        )
+        return {r.prompt_hash: (r.intent, r.score, r.reasoning) for r in rows}
+
+    def _store_cached_results(self, db: Session, fresh: Dict[str, Tuple[str, int, str]]) -> None:
+        try:
+            existing = {
+                h for (h,) in db.query(AIResponseCache.prompt_hash)
+                .filter(AIResponseCache.prompt_hash.in_(fresh.keys()))
+                .all()
+            }
+            rows = [
+                {"prompt_hash": h, "intent": intent, "score": score, "reasoning": reasoning}
+                for h, (intent, score, reasoning) in fresh.items()
+                if h not in existing
+            ]
+            if rows:
+                db.execute(AIResponseCache.__table__.insert(), rows)
+                db.commit()
+        except Exception as e:
+            logger.warning(f"Failed to persist AI response cache: {str(e)}")
+            db.rollback()
+
+    async def ai_intent_score_bulk(self, prospects: List[Dict], offer_data: Dict,
+                                   db: Optional[Session] = None,
+                                   progress_cb: Optional[Callable[[int], None]] = None) -> List[Tuple[str, int, str]]:
         if not prospects:
             return []
-            
-        offer_data = self._normalize_offer_data(offer_data)
-        
-        batches = [prospects[i:i + self.batch_size] 
-                  for i in range(0, len(prospects), self.batch_size)]
-        
-        all_results = []
-        
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_batch = {
-                executor.submit(self._process_batch, batch, offer_data): batch 
-                for batch in batches
-            }
-            
-            for future in as_completed(future_to_batch):
-                batch = future_to_batch[future]
-                try:
-                    batch_results = future.result(timeout=30)
-                    all_results.extend(batch_results)
-                except Exception as e:
-                    logger.warning(f"Batch processing failed: {str(e)}")
-                    fallback_results = [
-                        ("Low", self.weights.AI_LOW_SCORE, f"Batch failed: {str(e)}")
-                        for _ in batch
-                    ]
-                    all_results.extend(fallback_results)
-        
-        return all_results
-    
-    def _process_batch(self, prospects_batch: List[Dict], offer_data: Dict) -> List[Tuple[str, int, str]]:
-        try:
-            prompt = self._build_batch_prompt(prospects_batch, offer_data)
-            
-            completion = client.chat.completions.create(
+
+        # Offer-level work happens exactly once per request; every batch
+        # reuses the same preamble string. Callers (final_score_bulk) have
+        # already normalized offer_data.
+        offer_info = self._build_offer_info(offer_data)
+
+        results: List[Optional[Tuple[str, int, str]]] = [None] * len(prospects)
+        keys = [self._prospect_cache_key(p, offer_data) for p in prospects]
+
+        if db is not None:
+            cached = self._load_cached_results(db, keys)
+            for i, key in enumerate(keys):
+                if key in cached:
+                    results[i] = cached[key]
+            if cached:
+                logger.info(f"AI cache: {len([r for r in results if r])} of {len(prospects)} prospects served from cache")
+
+        pending = [i for i in range(len(prospects)) if results[i] is None]
+
+        # Duplicate prospects (same role/industry/bio, hence same cache key)
+        # share one LLM answer: only the first of each group is sent out.
+        representatives: Dict[str, int] = {}
+        for i in pending:
+            representatives.setdefault(keys[i], i)
+        unique_pending = list(representatives.values())
+        if len(unique_pending) < len(pending):
+            logger.info(f"Deduplicated {len(pending)} prospects down to {len(unique_pending)} LLM candidates")
+
+        batches = [unique_pending[i:i + self.batch_size]
+                  for i in range(0, len(unique_pending), self.batch_size)]
+
+        # Cache hits and duplicates are already resolved
+        if progress_cb is not None and len(unique_pending) < len(prospects):
+            progress_cb(len(prospects) - len(unique_pending))
+
+        # Fan the batches out with non-blocking calls, bounded by a
+        # semaphore so we stay under Groq's rate limits.
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(indices: List[int]):
+            try:
+                async with semaphore:
+                    return await self._process_batch_async(
+                        [prospects[i] for i in indices], offer_info
+                    )
+            finally:
+                if progress_cb is not None:
+                    progress_cb(len(indices))
+
+        batch_results = await asyncio.gather(
+            *(bounded(indices) for indices in batches), return_exceptions=True
+        )
+
+        fresh: Dict[str, Tuple[str, int, str]] = {}
+        for indices, result in zip(batches, batch_results):
+            if isinstance(result, Exception):
+                logger.warning(f"Batch processing failed: {str(result)}")
+                for i in indices:
+                    results[i] = ("Low", self.weights.AI_LOW_SCORE, f"Batch failed: {str(result)}")
+            else:
+                for i, scored in zip(indices, result):
+                    results[i] = scored
+                    # Only cache answers the model actually gave
+                    if scored[2] != "Could not parse AI response":
+                        fresh[keys[i]] = scored
+
+        # Fan each group's answer back out to its duplicates
+        for i in pending:
+            if results[i] is None:
+                results[i] = results[representatives[keys[i]]]
+
+        if db is not None and fresh:
+            self._store_cached_results(db, fresh)
+
+        return results
+
+    async def _process_batch_async(self, prospects_batch: List[Dict], offer_info: str) -> List[Tuple[str, int, str]]:
+        prompt = self._build_batch_prompt(prospects_batch, offer_info)
+        response = await self._call_groq(prompt)
+        return self._parse_batch_response(response, len(prospects_batch))
+
+    @retry(
+        wait=wait_random_exponential(min=1, max=30),
+        stop=stop_after_attempt(4),
+        retry=retry_if_exception_type((RateLimitError, APIConnectionError)),
+        reraise=True,
+    )
+    async def _call_groq(self, prompt: str) -> str:
+        # Reserve an estimated token budget (~4 chars per token, plus the
+        # completion budget) before taking a request slot.
+        estimated_tokens = len(prompt) // 4 + self.max_completion_tokens
+        await _TOKEN_LIMITER.acquire(
+            min(estimated_tokens, _TOKEN_LIMITER.max_rate)
+        )
+        async with _REQUEST_LIMITER:
+            completion = await async_client.chat.completions.create(
                 model="llama-3.1-8b-instant",
                 messages=[{"role": "user", "content": prompt}],
-                max_tokens=800,
+                max_tokens=self.max_completion_tokens,
                 temperature=0.1,
                 timeout=30
             )
 
-            response = completion.choices[0].message.content.strip()
-            return self._parse_batch_response(response, len(prospects_batch))
-            
-        except Exception as e:
-            logger.warning(f"Batch AI scoring failed: {str(e)}")
-            return [
-                ("Low", self.weights.AI_LOW_SCORE, f"AI unavailable: {str(e)}")
-                for _ in prospects_batch
-            ]
+        return completion.choices[0].message.content.strip()
     
-    def _build_batch_prompt(self, prospects_batch: List[Dict], offer_data: Dict) -> str:
-        value_props = offer_data.get('value_props', [])
-        ideal_use_cases = offer_data.get('ideal_use_cases', [])
-        
-        offer_info = f"""
-                    Product: {offer_data.get('name', 'N/A')}
-                    Value Props: {', '.join(value_props) if value_props else 'N/A'}
-                    Ideal Use Cases: {', '.join(ideal_use_cases) if ideal_use_cases else 'N/A'}
-                            """.strip()
-        
+    def _build_batch_prompt(self, prospects_batch: List[Dict], offer_info: str) -> str:
         prospects_info = ""
         for i, prospect in enumerate(prospects_batch, 1):
             prospects_info += f"""
@@ -243,37 +401,29 @@ Respond with: [HIGH/MEDIUM/LOW] - [brief explanation]"""
         return prompt
     
     def _parse_batch_response(self, response: str, expected_count: int) -> List[Tuple[str, int, str]]:
+        # One pass over the response indexed by prospect number, instead of
+        # rescanning every line for each expected prospect.
+        found = {}
+        for line in response.split('\n'):
+            m = _PROSPECT_LINE.search(line)
+            if m:
+                found[int(m.group(1))] = (m.group(2).upper(), m.group(3).strip())
+
+        intents = {
+            "HIGH": ("High", self.weights.AI_HIGH_SCORE),
+            "MEDIUM": ("Medium", self.weights.AI_MEDIUM_SCORE),
+            "LOW": ("Low", self.weights.AI_LOW_SCORE),
+        }
+
         results = []
-        lines = [line.strip() for line in response.split('\n') if line.strip()]
-        
-        for i in range(expected_count):
-            try:
-                prospect_line = None
-                for line in lines:
-                    if f"PROSPECT {i+1}:" in line.upper():
-                        prospect_line = line
-                        break
-                
-                if prospect_line:
-                    if "HIGH" in prospect_line.upper():
-                        intent = "High"
-                        score = self.weights.AI_HIGH_SCORE
-                    elif "MEDIUM" in prospect_line.upper():
-                        intent = "Medium"
-                        score = self.weights.AI_MEDIUM_SCORE
-                    else:
-                        intent = "Low"
-                        score = self.weights.AI_LOW_SCORE
-                    
-                    reasoning = prospect_line.split('-', 1)[-1].strip() if '-' in prospect_line else prospect_line
-                    results.append((intent, score, reasoning))
-                else:
-                    results.append(("Low", self.weights.AI_LOW_SCORE, "Could not parse AI response"))
-                    
-            except Exception as e:
-                logger.warning(f"Error parsing prospect {i+1}: {str(e)}")
-                results.append(("Low", self.weights.AI_LOW_SCORE, f"Parse error: {str(e)}"))
-        
+        for i in range(1, expected_count + 1):
+            match = found.get(i)
+            if match:
+                intent, score = intents[match[0]]
+                results.append((intent, score, match[1] or "No explanation given"))
+            else:
+                results.append(("Low", self.weights.AI_LOW_SCORE, "Could not parse AI response"))
+
         return results
     
     def _normalize_offer_data(self, offer_data: Any) -> Dict:
@@ -312,16 +462,20 @@ Respond with: [HIGH/MEDIUM/LOW] - [brief explanation]"""
         
         return normalized_offer
 
-    def final_score_bulk(self, leads: List[Dict], offer_data: Dict) -> List[Tuple[str, int, str]]:
+    async def final_score_bulk(self, leads: List[Dict], offer_data: Dict,
+                               db: Optional[Session] = None,
+                               progress_cb: Optional[Callable[[int], None]] = None) -> List[Tuple[str, int, str]]:
         if not leads:
             return []
-        
+
         offer_data = self._normalize_offer_data(offer_data)
-        ai_results = self.ai_intent_score_bulk(leads, offer_data)
-        
+        ai_results = await self.ai_intent_score_bulk(leads, offer_data, db=db,
+                                                     progress_cb=progress_cb)
+        rule_scores = self.calculate_rule_scores(leads, offer_data)
+
         final_results = []
         for i, (intent, ai_score, reasoning) in enumerate(ai_results):
-            rule_score = self.calculate_rule_score(leads[i], offer_data)
+            rule_score = rule_scores[i]
             final_score = rule_score + ai_score
             
             logger.info(f"Lead {i+1}: {leads[i].get('name', 'Unknown')} - "